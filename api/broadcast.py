@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+
+class Broadcaster:
+    """
+    Fans out change events to every streaming subscriber of this worker.
+
+    Each subscriber owns a bounded queue, so an idle connection only costs a queue and a suspended
+    task. A subscriber that falls behind is dropped instead of buffering without limit, it will get
+    a new version marker when it reconnects.
+    """
+
+    def __init__(self, max_queued_events: int = 100):
+        self.max_queued_events = max_queued_events
+        self._subscribers: set[asyncio.Queue] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def subscribe(self) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.max_queued_events)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def publish(
+        self, event: str, version: int, added: list[str], removed: list[str]
+    ) -> None:
+        # Changes are published from other threads, so the fan-out is handed over to the event loop.
+        message = (event, {"version": version, "added": added, "removed": removed})
+
+        if self._loop is None:
+            return
+
+        try:
+            self._loop.call_soon_threadsafe(self._fan_out, message)
+        except RuntimeError:
+            # The event loop was closed, there's nobody left to notify.
+            pass
+
+    def _fan_out(self, message: tuple[str, dict]) -> None:
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.unsubscribe(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+
+def format_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+broadcaster = Broadcaster()
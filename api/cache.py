@@ -0,0 +1,267 @@
+import json
+import logging
+import select
+import threading
+import psycopg2
+from sqlalchemy import make_url, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from api.broadcast import broadcaster
+from api.database import SQLALCHEMY_DB_URL, SessionLocal
+from api.models import ExitNodeIntervals, ExitNodesVersion, IPAddress
+
+logger = logging.getLogger(__name__)
+
+EXEMPTIONS_CHANNEL = "exemptions"
+EXIT_NODES_CHANNEL = "exit_nodes"
+
+# PostgreSQL rejects payloads of 8000 bytes or more, bigger changes ask the workers to reload.
+MAX_PAYLOAD_SIZE = 7900
+
+# Seconds to wait before reconnecting the listener after the DataBase connection is lost.
+RECONNECT_DELAY = 5
+
+# libpq doesn't understand SQLAlchemy's driver suffixes, like 'postgresql+psycopg2://'.
+LISTENER_DSN = (
+    make_url(SQLALCHEMY_DB_URL)
+    .set(drivername="postgresql")
+    .render_as_string(hide_password=False)
+)
+
+
+def bump_version(db: Session) -> int:
+    """
+    Increments the shared version of the filtered list. The row stays locked until the commit,
+    so the versions are committed, and notified, in order.
+    """
+    statement = (
+        insert(ExitNodesVersion)
+        .values(id=1, version=1)
+        .on_conflict_do_update(
+            index_elements=["id"], set_={"version": ExitNodesVersion.version + 1}
+        )
+        .returning(ExitNodesVersion.version)
+    )
+
+    return db.execute(statement).scalar_one()
+
+
+def notify(db: Session, channel: str, payload: dict) -> None:
+    # PostgreSQL only delivers the notification when the transaction commits.
+    message = json.dumps(payload)
+
+    if len(message) >= MAX_PAYLOAD_SIZE:
+        message = json.dumps({"version": payload["version"], "reload": True})
+
+    db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": channel, "payload": message},
+    )
+
+
+def notify_exemption_change(db: Session, operation: str, exemption: IPAddress) -> None:
+    """
+    Publishes an exemption change to every worker, it has to be sent before `db.commit()`.
+    """
+    notify(
+        db,
+        EXEMPTIONS_CHANNEL,
+        {
+            "version": bump_version(db),
+            "operation": operation,
+            "id": exemption.id,
+            "ipaddress": exemption.ipaddress,
+        },
+    )
+
+
+def notify_exit_nodes_change(db: Session, added: set[str], removed: set[str]) -> None:
+    """
+    Publishes the changes of a recorded Exit Nodes list to every worker, it has to be sent
+    before `db.commit()`.
+    """
+    notify(
+        db,
+        EXIT_NODES_CHANNEL,
+        {
+            "version": bump_version(db),
+            "added": sorted(added),
+            "removed": sorted(removed),
+        },
+    )
+
+
+class ExitNodesCache:
+    """
+    In-memory, versioned copy of the listed Exit Nodes and the exempted IP Addresses of this
+    worker.
+
+    It is loaded once and then kept up to date by a background thread that LISTENs to the
+    notifications sent by `notify_exemption_change` and `notify_exit_nodes_change`, so reads
+    never hit the DataBase. Every change bumps the version shared by all the workers, and the
+    resulting changes of the filtered list are published to this worker's stream subscribers.
+    """
+
+    def __init__(self):
+        self.version = 0
+        # Set while the listener isn't connected, the last snapshot keeps being served meanwhile
+        # and the endpoints tell the clients it may be outdated.
+        self.stale = True
+        self._exemptions: dict[int, str] = {}
+        self._exempted_ips: frozenset[str] = frozenset()
+        self._listed_ips: frozenset[str] = frozenset()
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _wait_until_loaded(self) -> None:
+        # Only the first read of the worker waits, afterwards the last snapshot is always served.
+        if not self._loaded.is_set():
+            if self._thread and self._thread.is_alive():
+                self._loaded.wait(timeout=RECONNECT_DELAY)
+            if not self._loaded.is_set():
+                self.reload()
+
+    @property
+    def listed_ips(self) -> frozenset[str]:
+        self._wait_until_loaded()
+        return self._listed_ips
+
+    def loaded_version(self) -> int:
+        """
+        Returns the version of the loaded lists, waiting for the first load of the worker.
+        """
+        self._wait_until_loaded()
+        return self.version
+
+    def snapshot(self) -> tuple[int, list[str]]:
+        """
+        Returns the filtered list together with the version it corresponds to.
+        """
+        self._wait_until_loaded()
+        with self._lock:
+            return self.version, sorted(self._listed_ips - self._exempted_ips)
+
+    def reload(self) -> None:
+        db = SessionLocal()
+        try:
+            # A single snapshot of the DataBase, so the version matches the lists.
+            db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+            version = (
+                db.query(ExitNodesVersion.version)
+                .filter(ExitNodesVersion.id == 1)
+                .scalar()
+            )
+            exemptions = {
+                row.id: row.ipaddress
+                for row in db.query(IPAddress.id, IPAddress.ipaddress)
+            }
+            listed_ips = frozenset(
+                row.ipaddress
+                for row in db.query(ExitNodeIntervals.ipaddress).filter(
+                    ExitNodeIntervals.open
+                )
+            )
+        finally:
+            db.close()
+
+        self._update(
+            version or 0, exemptions, listed_ips, publish=self._loaded.is_set()
+        )
+        self._loaded.set()
+
+    def apply(self, channel: str, payload: dict) -> None:
+        # Changes already included in the last reload are skipped, missing ones force a reload.
+        if payload["version"] <= self.version:
+            return
+
+        if payload["version"] != self.version + 1 or payload.get("reload"):
+            self.reload()
+            return
+
+        exemptions = dict(self._exemptions)
+        listed_ips = self._listed_ips
+
+        if channel == EXEMPTIONS_CHANNEL and payload["operation"] == "insert":
+            exemptions[payload["id"]] = payload["ipaddress"]
+        elif channel == EXEMPTIONS_CHANNEL:
+            exemptions.pop(payload["id"], None)
+        else:
+            listed_ips = (listed_ips | set(payload["added"])) - set(payload["removed"])
+
+        self._update(payload["version"], exemptions, listed_ips, publish=True)
+
+    def _update(
+        self,
+        version: int,
+        exemptions: dict[int, str],
+        listed_ips: frozenset[str],
+        publish: bool,
+    ) -> None:
+        with self._lock:
+            previous = self._listed_ips - self._exempted_ips
+
+            self._exemptions = exemptions
+            self._exempted_ips = frozenset(exemptions.values())
+            self._listed_ips = listed_ips
+            self.version = version
+
+            current = self._listed_ips - self._exempted_ips
+
+            # Published under the lock, so the subscribers get the versions in order.
+            if publish:
+                broadcaster.publish(
+                    "exit-nodes",
+                    version=version,
+                    added=sorted(current - previous),
+                    removed=sorted(previous - current),
+                )
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._listen, name="exit-nodes-listener", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+    def _listen(self) -> None:
+        while not self._stopped.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(LISTENER_DSN)
+                connection.autocommit = True
+
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {EXEMPTIONS_CHANNEL}")
+                    cursor.execute(f"LISTEN {EXIT_NODES_CHANNEL}")
+
+                # Changes committed while there was no listener are picked up by a full reload.
+                self.reload()
+                self.stale = False
+
+                while not self._stopped.is_set():
+                    if select.select([connection], [], [], 1) == ([], [], []):
+                        continue
+
+                    connection.poll()
+                    while connection.notifies:
+                        notification = connection.notifies.pop(0)
+                        self.apply(
+                            notification.channel, json.loads(notification.payload)
+                        )
+            except Exception:
+                logger.exception("The Exit Nodes listener lost its connection.")
+                self.stale = True
+                self._stopped.wait(RECONNECT_DELAY)
+            finally:
+                if connection:
+                    connection.close()
+
+
+exit_nodes_cache = ExitNodesCache()
@@ -0,0 +1,169 @@
+import ipaddress
+import logging
+import threading
+import requests
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from api.cache import notify_exit_nodes_change
+from api.database import SessionLocal
+from api.models import ExitNodeIntervals, ExitNodesFetches
+
+logger = logging.getLogger(__name__)
+
+EXIT_NODES_URL = "https://www.dan.me.uk/torlist/?exit"
+
+# The external source only allows getting the list once every 30 minutes.
+REFRESH_INTERVAL = timedelta(minutes=30)
+
+# Seconds between the checks of every worker for a due refresh.
+REFRESH_CHECK_INTERVAL = 60
+
+# Advisory lock that serializes the recording of the fetched lists across workers.
+EXIT_NODES_LOCK = 7_400_001
+
+
+def fetch_exit_nodes() -> list[str]:
+    response = requests.get(url=EXIT_NODES_URL, timeout=30)
+    response.raise_for_status()
+
+    return response.text.split("\n")
+
+
+def record_exit_nodes(db: Session, exit_nodes: list[str]) -> None:
+    """
+    Tracks every fetched IP Address as a first-seen/last-seen interval. Addresses that are still
+    listed extend their open interval, missing ones get it closed and new ones open a fresh one.
+    """
+    current_ips = set()
+    skipped = 0
+    for line in filter(None, (line.strip() for line in exit_nodes)):
+        try:
+            ipaddress.ip_address(line)
+            current_ips.add(line)
+        except ValueError:
+            skipped += 1
+
+    # An error page served with a 200 would otherwise close every open interval for good.
+    if not current_ips:
+        raise ValueError("The fetched Exit Nodes list has no valid IP Address.")
+
+    if skipped:
+        logger.warning(
+            "Skipped %s lines of the Exit Nodes list that aren't IPs.", skipped
+        )
+
+    # Concurrent fetches wait here, so each one diffs against the intervals the previous one left.
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": EXIT_NODES_LOCK})
+    seen_at = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    open_intervals = db.query(ExitNodeIntervals).filter(ExitNodeIntervals.open)
+    open_ips = {
+        row.ipaddress
+        for row in open_intervals.with_entities(ExitNodeIntervals.ipaddress)
+    }
+
+    if current_ips & open_ips:
+        open_intervals.filter(
+            ExitNodeIntervals.ipaddress.in_(current_ips & open_ips)
+        ).update({ExitNodeIntervals.last_seen: seen_at}, synchronize_session=False)
+
+    if open_ips - current_ips:
+        open_intervals.filter(
+            ExitNodeIntervals.ipaddress.in_(open_ips - current_ips)
+        ).update({ExitNodeIntervals.open: False}, synchronize_session=False)
+
+    if current_ips - open_ips:
+        db.execute(
+            insert(ExitNodeIntervals).on_conflict_do_nothing(
+                index_elements=["ipaddress"], index_where=text("open")
+            ),
+            [
+                {
+                    "ipaddress": ip,
+                    "first_seen": seen_at,
+                    "last_seen": seen_at,
+                    "open": True,
+                }
+                for ip in current_ips - open_ips
+            ],
+        )
+
+    notify_exit_nodes_change(
+        db, added=current_ips - open_ips, removed=open_ips - current_ips
+    )
+    db.commit()
+
+
+def refresh_exit_nodes() -> None:
+    """
+    Fetches and records the list if the last attempt of any worker is older than REFRESH_INTERVAL.
+    Only one worker at a time gets the lock, the rest skip the check.
+    """
+    db = SessionLocal()
+    try:
+        locked = db.execute(
+            text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": EXIT_NODES_LOCK}
+        ).scalar()
+        if not locked:
+            return
+
+        last_attempt = (
+            db.query(ExitNodesFetches.attempted_at)
+            .filter(ExitNodesFetches.id == 1)
+            .scalar()
+        )
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if last_attempt and now - last_attempt < REFRESH_INTERVAL:
+            return
+
+        # Stored before fetching, so failed fetches also hold off every worker for a whole window.
+        db.execute(
+            insert(ExitNodesFetches)
+            .values(id=1, attempted_at=now)
+            .on_conflict_do_update(index_elements=["id"], set_={"attempted_at": now})
+        )
+        db.commit()
+
+        record_exit_nodes(db, fetch_exit_nodes())
+    finally:
+        db.close()
+
+
+class ExitNodeRefresher:
+    """
+    Background thread that keeps the recorded list fresh, so the endpoints and the stream don't
+    depend on clients asking for it.
+    """
+
+    def __init__(self):
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="exit-nodes-refresher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                refresh_exit_nodes()
+            except requests.RequestException:
+                # The attempt is stored, no worker tries again until the window is over.
+                logger.exception("The Exit Nodes list couldn't be fetched.")
+            except Exception:
+                logger.exception("The Exit Nodes list couldn't be refreshed.")
+
+            self._stopped.wait(REFRESH_CHECK_INTERVAL)
+
+
+exit_node_refresher = ExitNodeRefresher()
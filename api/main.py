@@ -1,14 +1,50 @@
 from fastapi import FastAPI, Response, Request, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from api.routers import admin, auth, auditlogs, tornodes
-from api.database import engine, get_database, SessionLocal
+from api.database import get_database, replica_router, SessionLocal
 from api.routers.auth import get_current_user
+from api.rollups import UNMATCHED_ENDPOINT, rollup_buffer
+from api.cache import exit_nodes_cache
+from api.exitnodes import exit_node_refresher
+from api.ratelimit import (
+    MAX_CONCURRENT_REQUESTS,
+    get_principal,
+    get_rate_limit,
+    rate_limiter,
+    retry_after,
+)
 from api import models
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from typing import Annotated
 from sqlalchemy.orm import Session
+from starlette import status
+from starlette.routing import Match
 
-app = FastAPI(swagger_ui_parameters={"syntaxHighlight.theme": "obsidian"})
 
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keeps this worker's Exit Nodes and exemptions in sync with the rest of the workers.
+    exit_nodes_cache.start()
+    # Fetches the Exit Nodes list when it's due, only one worker does it at a time.
+    exit_node_refresher.start()
+    # Checks the lag of the read replicas, so the requests don't have to.
+    replica_router.start()
+    # Writes the counts of the requests into the rollups every few seconds.
+    rollup_buffer.start()
+    yield
+    rollup_buffer.stop()
+    replica_router.stop()
+    exit_node_refresher.stop()
+    exit_nodes_cache.stop()
+
+
+app = FastAPI(
+    swagger_ui_parameters={"syntaxHighlight.theme": "obsidian"},
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
+
 db_dependency = Annotated[Session, Depends(get_database)]
 
 
@@ -17,11 +53,18 @@ app.include_router(auth.router)
 app.include_router(tornodes.router)
 app.include_router(auditlogs.router)
 
+in_flight_requests = 0
+
 
 @app.middleware("http")
 async def api_logging(request: Request, call_next):
     response = await call_next(request)
 
+    # Event streams never end, so they can't be buffered like the rest of the responses.
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        await push_audit_log(request=request, response=response, db=SessionLocal())
+        return response
+
     response_body = b""
     async for chunk in response.body_iterator:
         response_body += chunk
@@ -36,6 +79,58 @@ async def api_logging(request: Request, call_next):
     )
 
 
+@app.middleware("http")
+async def rate_limiting(request: Request, call_next):
+    # Registered after 'api_logging' so it runs first, rejected requests never reach the DataBase.
+    global in_flight_requests
+
+    role, identity = get_principal(request)
+    prefix, (rate, capacity) = get_rate_limit(request.url.path, role)
+
+    wait = rate_limiter.acquire((identity, prefix), rate, capacity)
+    if wait:
+        count_rejected_request(request, identity, status.HTTP_429_TOO_MANY_REQUESTS)
+        return ORJSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content={"detail": "Too many requests."},
+            headers=retry_after(wait),
+        )
+
+    if in_flight_requests >= MAX_CONCURRENT_REQUESTS:
+        count_rejected_request(request, identity, status.HTTP_503_SERVICE_UNAVAILABLE)
+        return ORJSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": "The server is overloaded, try again later."},
+            headers=retry_after(1),
+        )
+
+    in_flight_requests += 1
+    try:
+        return await call_next(request)
+    finally:
+        in_flight_requests -= 1
+
+
+def count_rejected_request(request: Request, identity: str, status_code: int):
+    # Rejected requests are only counted, they aren't stored in the Logs. They never reached the router, so the route is matched here to key them like the rest.
+    route = next(
+        (
+            route
+            for route in app.routes
+            if route.matches(request.scope)[0] is Match.FULL
+        ),
+        None,
+    )
+    kind, _, name = identity.partition(":")
+
+    rollup_buffer.add(
+        endpoint=route.path if route else UNMATCHED_ENDPOINT,
+        username=name if kind == "user" else "anonymous",
+        status_code=status_code,
+        timestamp=datetime.now(timezone.utc).replace(tzinfo=None),
+    )
+
+
 async def push_audit_log(request: Request, response: Response, db: db_dependency):
     
     # This list will hold the Website Endpoints that don't require to be logged in the DB.
@@ -61,8 +156,23 @@ async def push_audit_log(request: Request, response: Response, db: db_dependency
         endpoint=request.url.path,
         host=request.url.hostname,
         status_code=response.status_code,
+        timestamp=datetime.now(timezone.utc).replace(tzinfo=None),
     )
 
     # return log_model
-    db.add(log_model)
-    db.commit()
+    try:
+        db.add(log_model)
+        db.commit()
+    finally:
+        db.close()
+
+    # The rollups count the route instead of the path, so path parameters don't multiply the rows.
+    # They are buffered, so requests never wait on the shared counter rows of other workers.
+    route = request.scope.get("route")
+
+    rollup_buffer.add(
+        endpoint=route.path if route else UNMATCHED_ENDPOINT,
+        username=log_model.username,
+        status_code=response.status_code,
+        timestamp=log_model.timestamp,
+    )
@@ -0,0 +1,38 @@
+from alembic import context
+from logging.config import fileConfig
+from api.database import SQLALCHEMY_DB_URL, engine
+from api import models
+
+config = context.config
+
+if config.config_file_name:
+    fileConfig(config.config_file_name)
+
+target_metadata = models.Base.metadata
+
+
+def run_migrations_offline() -> None:
+    # Renders the SQL instead of running it, for 'alembic upgrade head --sql'.
+    context.configure(
+        url=SQLALCHEMY_DB_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,114 @@
+"""Initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-05-20 10:00:00.000000
+
+"""
+
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Databases created before the migrations already have some of the tables, created by
+    # 'create_all' when the app started, so only the missing ones are created.
+    existing_tables = (
+        [] if context.is_offline_mode() else sa.inspect(op.get_bind()).get_table_names()
+    )
+
+    if "ipaddress" not in existing_tables:
+        op.create_table(
+            "ipaddress",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("ipaddress", sa.String(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("ipaddress"),
+        )
+        op.create_index("ix_ipaddress_id", "ipaddress", ["id"])
+
+    if "users" not in existing_tables:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("username", sa.String(), nullable=True),
+            sa.Column("hashed_password", sa.String(), nullable=True),
+            sa.Column("role", sa.String(), nullable=True),
+            sa.Column("active", sa.Boolean(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("username"),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+
+    if "auditlogs" not in existing_tables:
+        op.create_table(
+            "auditlogs",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("username", sa.String(), nullable=True),
+            sa.Column("method", sa.String(), nullable=True),
+            sa.Column("endpoint", sa.String(), nullable=True),
+            sa.Column("host", sa.String(), nullable=True),
+            sa.Column("status_code", sa.String(), nullable=True),
+            sa.Column("timestamp", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_auditlogs_id", "auditlogs", ["id"])
+
+    if "exitnodeintervals" not in existing_tables:
+        op.create_table(
+            "exitnodeintervals",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("ipaddress", sa.String(), nullable=False),
+            sa.Column("first_seen", sa.DateTime(), nullable=False),
+            sa.Column("last_seen", sa.DateTime(), nullable=False),
+            sa.Column("open", sa.Boolean(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_exitnodeintervals_id", "exitnodeintervals", ["id"])
+        op.create_index(
+            "ix_exitnodeintervals_lookup",
+            "exitnodeintervals",
+            ["ipaddress", "first_seen", "last_seen"],
+        )
+        op.create_index(
+            "ix_exitnodeintervals_open",
+            "exitnodeintervals",
+            ["ipaddress"],
+            unique=True,
+            postgresql_where=sa.text("open"),
+        )
+
+    if "auditlogrollups" not in existing_tables:
+        op.create_table(
+            "auditlogrollups",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("granularity", sa.String(), nullable=False),
+            sa.Column("bucket", sa.DateTime(), nullable=False),
+            sa.Column("endpoint", sa.String(), nullable=False),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("status_code", sa.Integer(), nullable=False),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint(
+                "granularity",
+                "bucket",
+                "endpoint",
+                "username",
+                "status_code",
+                name="uq_auditlogrollups_bucket",
+            ),
+        )
+        op.create_index("ix_auditlogrollups_id", "auditlogrollups", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("auditlogrollups")
+    op.drop_table("exitnodeintervals")
+    op.drop_table("auditlogs")
+    op.drop_table("users")
+    op.drop_table("ipaddress")
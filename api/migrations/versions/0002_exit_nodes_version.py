@@ -0,0 +1,29 @@
+"""Exit Nodes version
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-05-27 10:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "exitnodesversion",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.execute("INSERT INTO exitnodesversion (id, version) VALUES (1, 0)")
+
+
+def downgrade() -> None:
+    op.drop_table("exitnodesversion")
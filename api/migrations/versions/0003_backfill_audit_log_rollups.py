@@ -0,0 +1,49 @@
+"""Backfill audit log rollups
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-06-03 10:00:00.000000
+
+"""
+
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Logs written before the rollups existed are counted here. Only the ones older than the
+    # first rollup of each granularity are, so anything the app already counted isn't doubled.
+    # The old logs only have the raw path, so they are bucketed under it instead of the route.
+    for granularity in ("minute", "hour"):
+        op.execute(f"""
+            INSERT INTO auditlogrollups
+                (granularity, bucket, endpoint, username, status_code, count)
+            SELECT
+                '{granularity}',
+                date_trunc('{granularity}', timestamp),
+                endpoint,
+                COALESCE(username, 'anonymous'),
+                status_code::int,
+                count(*)
+            FROM auditlogs
+            WHERE timestamp IS NOT NULL
+                AND endpoint IS NOT NULL
+                AND status_code IS NOT NULL
+                AND timestamp < COALESCE(
+                    (
+                        SELECT min(bucket) FROM auditlogrollups
+                        WHERE granularity = '{granularity}'
+                    ),
+                    'infinity'
+                )
+            GROUP BY 2, 3, 4, 5
+            """)
+
+
+def downgrade() -> None:
+    # The backfilled rows can't be told apart from the ones the app wrote, so they are kept.
+    pass
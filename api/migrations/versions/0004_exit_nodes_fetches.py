@@ -0,0 +1,28 @@
+"""Exit Nodes fetches
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-06-10 10:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "exitnodesfetches",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("attempted_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("exitnodesfetches")
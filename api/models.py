@@ -1,5 +1,15 @@
 from api.database import Base
-from sqlalchemy import Column, String, Integer, Boolean, DateTime
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    String,
+    Integer,
+    Boolean,
+    DateTime,
+    Index,
+    UniqueConstraint,
+    text,
+)
 from datetime import datetime, timezone
 
 
@@ -30,3 +40,65 @@ class AuditLogs(Base):
     host = Column(String)
     status_code = Column(String)
     timestamp = Column(DateTime, default=datetime.now(timezone.utc))
+
+
+class ExitNodeIntervals(Base):
+    __tablename__ = "exitnodeintervals"
+    __table_args__ = (
+        # Serves "was this IP an Exit Node at time T" as a single index range scan.
+        Index("ix_exitnodeintervals_lookup", "ipaddress", "first_seen", "last_seen"),
+        # Only the intervals still open are touched when a new list is fetched.
+        Index(
+            "ix_exitnodeintervals_open",
+            "ipaddress",
+            unique=True,
+            postgresql_where=text("open"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    ipaddress = Column(String, nullable=False)
+    first_seen = Column(DateTime, nullable=False)
+    last_seen = Column(DateTime, nullable=False)
+    open = Column(Boolean, nullable=False, default=True)
+
+
+class ExitNodesVersion(Base):
+    __tablename__ = "exitnodesversion"
+
+    # Single row with the version shared by all the workers, bumped on every change of the
+    # filtered Exit Nodes list.
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+class ExitNodesFetches(Base):
+    __tablename__ = "exitnodesfetches"
+
+    # Single row with the last time any worker tried to fetch the Exit Nodes list, successful or
+    # not, so the source isn't hit again by another worker within its window.
+    id = Column(Integer, primary_key=True)
+    attempted_at = Column(DateTime, nullable=False)
+
+
+class AuditLogRollups(Base):
+    __tablename__ = "auditlogrollups"
+    __table_args__ = (
+        # Also serves the time range scans of '/logs/stats'.
+        UniqueConstraint(
+            "granularity",
+            "bucket",
+            "endpoint",
+            "username",
+            "status_code",
+            name="uq_auditlogrollups_bucket",
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String, nullable=False)
+    bucket = Column(DateTime, nullable=False)
+    endpoint = Column(String, nullable=False)
+    username = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
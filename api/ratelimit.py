@@ -0,0 +1,129 @@
+import math
+import time
+from collections import OrderedDict
+import jwt
+from fastapi import Request
+from api.routers.auth import SECRET_KEY, ALGORITHM
+
+# Requests per second and burst size for every route prefix and role. The longest matching prefix
+# wins. The 'anonymous' role applies to requests without a valid Bearer Token, which are limited
+# per client IP Address instead of per User.
+RATE_LIMITS = {
+    "/": {
+        "admin": (20, 40),
+        "contributor": (10, 20),
+        "reader": (10, 20),
+        "anonymous": (2, 10),
+    },
+    "/authentication/token": {
+        "anonymous": (0.2, 5),
+    },
+    "/tor-nodes": {
+        "admin": (10, 20),
+        "contributor": (5, 10),
+        "reader": (5, 10),
+        "anonymous": (1, 5),
+    },
+}
+
+# Requests handled at the same time by a worker before the rest are shed with a 503.
+MAX_CONCURRENT_REQUESTS = 100
+
+# Seconds without requests after which a bucket is dropped. It has to be longer than the time any
+# bucket takes to refill, so dropping it is the same as keeping a full one.
+IDLE_BUCKET_TTL = 300
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """
+        Takes a token from the bucket. Returns 0 if the request is allowed, otherwise the seconds
+        until the next token is available.
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Token buckets for every active client of this worker. Buckets are kept in least recently used
+    order so the idle ones can be evicted from the front, keeping the memory bound to the active
+    clients.
+    """
+
+    def __init__(self, idle_ttl: float = IDLE_BUCKET_TTL):
+        self.idle_ttl = idle_ttl
+        self._buckets: OrderedDict[tuple, TokenBucket] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def acquire(self, key: tuple, rate: float, capacity: int) -> float:
+        now = time.monotonic()
+        self._evict(now)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, capacity, now)
+        else:
+            # The role of a User can change while its bucket is alive, the current limits apply.
+            bucket.rate = rate
+            bucket.capacity = capacity
+            self._buckets.move_to_end(key)
+
+        return bucket.take(now)
+
+    def _evict(self, now: float) -> None:
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket.updated < self.idle_ttl:
+                break
+            del self._buckets[key]
+
+
+def get_principal(request: Request) -> tuple[str, str]:
+    """
+    Returns the role and identity to rate limit the request by. Authenticated requests are limited
+    per User and anonymous ones per client IP Address.
+    """
+    token = request.headers.get("Authorization", "").split(" ")[-1]
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        host = request.client.host if request.client else "unknown"
+        return "anonymous", f"ip:{host}"
+
+    return str(payload.get("role")).casefold(), f"user:{payload.get('sub')}"
+
+
+def get_rate_limit(path: str, role: str) -> tuple[str, tuple[float, int]]:
+    prefix = max((prefix for prefix in RATE_LIMITS if path.startswith(prefix)), key=len)
+
+    # Roles without a limit for the route fall back to the default ones.
+    for limits in (RATE_LIMITS[prefix], RATE_LIMITS["/"]):
+        if role in limits:
+            return prefix, limits[role]
+
+    return prefix, RATE_LIMITS["/"]["anonymous"]
+
+
+def retry_after(seconds: float) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,127 @@
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from api.database import SessionLocal
+from api.models import AuditLogRollups
+
+logger = logging.getLogger(__name__)
+
+# How each rollup granularity truncates the timestamp of a Log into its bucket.
+ROLLUP_GRANULARITIES = {
+    "minute": lambda timestamp: timestamp.replace(second=0, microsecond=0),
+    "hour": lambda timestamp: timestamp.replace(minute=0, second=0, microsecond=0),
+}
+
+# Requests that match no route (404s, scanners probing paths) share a single rollup endpoint.
+UNMATCHED_ENDPOINT = "<unmatched>"
+
+# Seconds between the writes of the buffered counts into the rollups, so the latest requests can
+# take this long to show up in them.
+ROLLUP_FLUSH_INTERVAL = 10
+
+
+def upsert_rollups(db: Session, counts: Counter) -> None:
+    """
+    Adds the counts, keyed by (granularity, bucket, endpoint, username, status_code), to their
+    rollup rows. The rows are upserted in order, so the flushes of different workers lock them in
+    the same order and can't deadlock.
+    """
+    statement = insert(AuditLogRollups).values(
+        [
+            {
+                "granularity": granularity,
+                "bucket": bucket,
+                "endpoint": endpoint,
+                "username": username,
+                "status_code": status_code,
+                "count": count,
+            }
+            for (
+                granularity,
+                bucket,
+                endpoint,
+                username,
+                status_code,
+            ), count in sorted(counts.items())
+        ]
+    )
+
+    db.execute(
+        statement.on_conflict_do_update(
+            constraint="uq_auditlogrollups_bucket",
+            set_={"count": AuditLogRollups.count + statement.excluded.count},
+        )
+    )
+
+
+def count_request(
+    endpoint: str, username: str, status_code: int, timestamp: datetime
+) -> Counter:
+    return Counter(
+        (granularity, truncate(timestamp), endpoint, username, status_code)
+        for granularity, truncate in ROLLUP_GRANULARITIES.items()
+    )
+
+
+class RollupBuffer:
+    """
+    Counts requests in memory and adds them to the rollups from a background thread, every
+    ROLLUP_FLUSH_INTERVAL seconds. Each flush upserts every counter row once, instead of every
+    request locking them in its own transaction. Counts that fail to be written are kept for the
+    next flush.
+    """
+
+    def __init__(self):
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add(
+        self, endpoint: str, username: str, status_code: int, timestamp: datetime
+    ) -> None:
+        counts = count_request(endpoint, username, status_code, timestamp)
+        with self._lock:
+            self._counts.update(counts)
+
+    def flush(self) -> None:
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+
+        if not counts:
+            return
+
+        db = SessionLocal()
+        try:
+            upsert_rollups(db, counts)
+            db.commit()
+        except Exception:
+            logger.exception("The buffered rollups couldn't be written.")
+            with self._lock:
+                self._counts.update(counts)
+        finally:
+            db.close()
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="rollup-buffer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        # Flushes once more after being stopped, so the last counts aren't lost.
+        while not self._stopped.wait(ROLLUP_FLUSH_INTERVAL):
+            self.flush()
+        self.flush()
+
+
+rollup_buffer = RollupBuffer()
@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, Path
 from passlib.context import CryptContext
-from api.database import get_database
+from api.database import get_database, get_read_database
 from api.models import Users
 from api.routers.schemas import (
     Message,
     CreateUserRequest,
     UserUpdateRequest,
     CreateSuperAdminRequest,
+    UserResponse,
 )
 from .auth import get_current_user
 from typing import Annotated
@@ -19,6 +20,7 @@ router = APIRouter(
 )
 
 db_dependency = Annotated[Session, Depends(get_database)]
+read_db_dependency = Annotated[Session, Depends(get_read_database)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
 bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -27,8 +29,9 @@ bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 @router.get(
     "/users",
     status_code=status.HTTP_200_OK,
+    response_model=list[UserResponse],
 )
-async def get_users(db: db_dependency, user: user_dependency):
+async def get_users(db: read_db_dependency, user: user_dependency):
     """
     ## Gets all Users
 
@@ -46,17 +49,13 @@ async def get_users(db: db_dependency, user: user_dependency):
 
         - `list[Users]`: A list containing all of the Users saved in the DataBase that the user is authorized to see.
     """
-    if user.get("role").casefold() == "admin":
-        users = db.query(Users).all()
-    else:
-        user = db.query(Users).filter(Users.id == user.get("id")).first()
-        users = []
-        users.append(user)
+    # The hashed passwords are never loaded.
+    users = db.query(Users.id, Users.username, Users.role, Users.active)
 
-    for user in users:
-        user.hashed_password = ""
+    if user.get("role").casefold() != "admin":
+        users = users.filter(Users.id == user.get("id"))
 
-    return users
+    return users.all()
 
 
 @router.post(
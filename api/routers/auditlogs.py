@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
-from api.database import get_database
-from api.models import AuditLogs
+from fastapi import APIRouter, Depends, HTTPException, Query
+from api.database import get_database, get_read_database, to_utc
+from api.models import AuditLogs, AuditLogRollups
+from api.routers.schemas import AuditLogResponse, AuditLogStatsResponse
 from .auth import get_current_user
-from typing import Annotated
+from typing import Annotated, Literal, Optional
+from sqlalchemy import case, func
 from sqlalchemy.orm import Session
 from starlette import status
+from datetime import datetime
 
 router = APIRouter(
     prefix="/logs",
@@ -12,11 +15,12 @@ router = APIRouter(
 )
 
 db_dependency = Annotated[Session, Depends(get_database)]
+read_db_dependency = Annotated[Session, Depends(get_read_database)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
 
-@router.get("", status_code=status.HTTP_200_OK)
-async def get_logs(db: db_dependency, user: user_dependency):
+@router.get("", status_code=status.HTTP_200_OK, response_model=list[AuditLogResponse])
+async def get_logs(db: read_db_dependency, user: user_dependency):
     """
     ## Gets all Logs
 
@@ -40,6 +44,77 @@ async def get_logs(db: db_dependency, user: user_dependency):
             detail=f"The user '{user.get("username")}' doesn't have permission to list all the Logs.",
         )
 
-    all_logs = db.query(AuditLogs).all()
+    all_logs = db.query(
+        AuditLogs.id,
+        AuditLogs.username,
+        AuditLogs.method,
+        AuditLogs.endpoint,
+        AuditLogs.host,
+        AuditLogs.status_code,
+        AuditLogs.timestamp,
+    ).all()
 
     return all_logs
+
+
+@router.get(
+    "/stats",
+    status_code=status.HTTP_200_OK,
+    response_model=list[AuditLogStatsResponse],
+)
+async def get_log_stats(
+    db: read_db_dependency,
+    user: user_dependency,
+    granularity: Literal["minute", "hour"] = "hour",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    group_by: list[Literal["endpoint", "username", "status_code"]] = Query(default=[]),
+):
+    """
+    ## Gets the Log Statistics
+
+    This endpoint allows you to get the amount of requests and errors over time, without listing all the Logs. Requests are counted every 10 seconds, so the latest ones can take that long to show up.
+
+    - **Permissions**:
+
+        - To access this API Endpoint, the User must possess one of the following roles: `Admin` or `Contributor`.
+
+    - **Parameters**:
+
+        - `granularity`: The size of each time bucket, `minute` or `hour`. Defaults to `hour`.
+
+        - `start`: Optional. Only include the buckets starting at or after this time.
+
+        - `end`: Optional. Only include the buckets starting before this time.
+
+        - `group_by`: Optional. Any of `endpoint`, `username` and `status_code`, can be repeated.
+
+    - **Response**:
+
+        - `list[AuditLogStats]`: The `count` of requests and the `error_count` of the ones with a status code of 400 or higher, for every bucket and group.
+    """
+    if user.get("role").casefold() == "reader":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"The user '{user.get("username")}' doesn't have permission to list all the Logs.",
+        )
+
+    columns = [AuditLogRollups.bucket] + [
+        getattr(AuditLogRollups, column) for column in dict.fromkeys(group_by)
+    ]
+
+    stats = db.query(
+        *columns,
+        func.sum(AuditLogRollups.count).label("count"),
+        func.sum(
+            case((AuditLogRollups.status_code >= 400, AuditLogRollups.count), else_=0)
+        ).label("error_count"),
+    ).filter(AuditLogRollups.granularity == granularity)
+
+    if start:
+        stats = stats.filter(AuditLogRollups.bucket >= to_utc(start))
+
+    if end:
+        stats = stats.filter(AuditLogRollups.bucket < to_utc(end))
+
+    return stats.group_by(*columns).order_by(*columns).all()
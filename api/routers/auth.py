@@ -79,7 +79,12 @@ async def get_current_user(token: token_dependency):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Access."
             )
-        return {"username": username, "id": user_id, "role": role}
+        return {
+            "username": username,
+            "id": user_id,
+            "role": role,
+            "expires_at": payload.get("exp"),
+        }
 
 
 @router.post("/token", response_model=Token)
@@ -1,5 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional
+from datetime import datetime
+from ipaddress import ip_address
 
 
 class Message(BaseModel):
@@ -50,3 +52,93 @@ class UserUpdateRequest(BaseModel):
 
     class Config:
         json_schema_extra = {"example": {"password": "anotherPassword"}}
+
+
+class ExemptionResponse(BaseModel):
+    id: int
+    ipaddress: str
+
+    class Config:
+        from_attributes = True
+
+
+class UserResponse(BaseModel):
+    id: int
+    username: str
+    role: str
+    active: Optional[bool] = None
+
+    class Config:
+        from_attributes = True
+
+
+class AuditLogResponse(BaseModel):
+    id: int
+    username: Optional[str] = None
+    method: Optional[str] = None
+    endpoint: Optional[str] = None
+    host: Optional[str] = None
+    status_code: Optional[str] = None
+    timestamp: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ExitNodeIntervalResponse(BaseModel):
+    ipaddress: str
+    first_seen: datetime
+    last_seen: datetime
+    open: bool
+
+    class Config:
+        from_attributes = True
+
+
+class ExitNodeLookup(BaseModel):
+    ipaddress: str
+    timestamp: datetime
+
+    # A typo would otherwise be answered as an IP Address that was never an Exit Node.
+    @field_validator("ipaddress")
+    @classmethod
+    def validate_ipaddress(cls, value: str) -> str:
+        try:
+            ip_address(value)
+        except ValueError:
+            raise ValueError(f"'{value}' is not a valid IP Address.")
+        return value
+
+
+class ExitNodeLookupRequest(BaseModel):
+    lookups: list[ExitNodeLookup] = Field(max_length=1000)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "lookups": [
+                    {"ipaddress": "8.8.8.8", "timestamp": "2024-05-01T13:45:00Z"}
+                ]
+            }
+        }
+
+
+class ExitNodeLookupResponse(BaseModel):
+    ipaddress: str
+    timestamp: datetime
+    was_exit_node: bool
+
+    class Config:
+        from_attributes = True
+
+
+class AuditLogStatsResponse(BaseModel):
+    bucket: datetime
+    endpoint: Optional[str] = None
+    username: Optional[str] = None
+    status_code: Optional[int] = None
+    count: int
+    error_count: int
+
+    class Config:
+        from_attributes = True
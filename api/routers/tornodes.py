@@ -1,13 +1,28 @@
-from fastapi import APIRouter, HTTPException, Depends, Path
-import requests
+from fastapi import APIRouter, HTTPException, Depends, Path, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from starlette import status
-from api.routers.schemas import Message, CreateIPAddressRequest
-from api.models import IPAddress
-from api.database import get_database
+from api.routers.schemas import (
+    Message,
+    CreateIPAddressRequest,
+    ExemptionResponse,
+    ExitNodeIntervalResponse,
+    ExitNodeLookupRequest,
+    ExitNodeLookupResponse,
+)
+from api.models import IPAddress, ExitNodeIntervals
+from api.database import get_database, get_read_database, to_utc
+from api.broadcast import broadcaster, format_event
+from api.cache import exit_nodes_cache, notify_exemption_change
 from .auth import get_current_user
-from typing import Annotated
+from typing import Annotated, Optional
+from sqlalchemy import DateTime, Integer, String, column, exists, or_, select, values
 from sqlalchemy.orm import Session
+from datetime import datetime
+import asyncio
 import ipaddress
+import math
+import time
 
 router = APIRouter(
     prefix="/tor-nodes",
@@ -15,17 +30,19 @@ router = APIRouter(
 )
 
 db_dependency = Annotated[Session, Depends(get_database)]
+read_db_dependency = Annotated[Session, Depends(get_read_database)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
+# Seconds between SSE comments that keep idle connections from being closed by proxies.
+STREAM_KEEPALIVE = 15
 
-@router.get(
-    "/external-all", status_code=status.HTTP_200_OK, responses={403: {"model": Message}}
-)
+
+@router.get("/external-all", status_code=status.HTTP_200_OK)
 def get_external_exit_nodes(user: user_dependency) -> list:
     """
     ## Gets the IP Addresses from External Sources
 
-    This endpoint allows you to get the Exit Nodes from External Sources.
+    This endpoint allows you to get the Exit Nodes from External Sources. The list is fetched in the background every 30 minutes, this returns the last one fetched.
 
     - **Permissions**:
 
@@ -36,18 +53,8 @@ def get_external_exit_nodes(user: user_dependency) -> list:
         - `list[str]`: A list containing all the IP Addresses from the External Sources.
     """
 
-    response = requests.get(url="https://www.dan.me.uk/torlist/?exit")
-
-    try:
-        response.raise_for_status()
-    except requests.HTTPError:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="The external sources only allows you to get the data once every 30 minutes.",
-        )
-    else:
-        # Returns a List of all the IP Addresses
-        return response.text.split("\n")
+    # Returns a List of all the IP Addresses
+    return sorted(exit_nodes_cache.listed_ips)
 
 
 @router.post(
@@ -102,11 +109,18 @@ def create_exemptions(
             )
         ip_model = IPAddress(**exemption_request.model_dump())
         db.add(ip_model)
+        db.flush()
+
+        notify_exemption_change(db, "insert", ip_model)
         db.commit()
 
 
-@router.get("/exemptions", status_code=status.HTTP_200_OK)
-def get_exemptions(db: db_dependency, user: user_dependency) -> None:
+@router.get(
+    "/exemptions",
+    status_code=status.HTTP_200_OK,
+    response_model=list[ExemptionResponse],
+)
+def get_exemptions(db: read_db_dependency, user: user_dependency):
     """
     ## Gets all the TOR IP Address Exemption
 
@@ -123,7 +137,7 @@ def get_exemptions(db: db_dependency, user: user_dependency) -> None:
         - `list[IPAddress]`: The complete List of all the Exempted IP Addresses.
     """
 
-    all_exemptions = db.query(IPAddress).all()
+    all_exemptions = db.query(IPAddress.id, IPAddress.ipaddress).all()
 
     return all_exemptions
 
@@ -170,15 +184,16 @@ async def delete_exemption(
         )
 
     db.delete(ip_address)
+    notify_exemption_change(db, "delete", ip_address)
     db.commit()
 
 
 @router.get("/external-filtered-exemptions")
-def get_external_exit_nodes_filtered(db: db_dependency, user: user_dependency) -> list:
+def get_external_exit_nodes_filtered(response: Response, user: user_dependency) -> list:
     """
     ## Gets the IP Addresses from External Sources (Filtered)
 
-    This endpoint allows you to get the Exit Nodes from External Sources without the exempted IP Addresses.
+    This endpoint allows you to get the Exit Nodes from External Sources without the exempted IP Addresses. The list is fetched in the background every 30 minutes, this returns the last one fetched.
 
     - **Permissions**:
 
@@ -187,15 +202,174 @@ def get_external_exit_nodes_filtered(db: db_dependency, user: user_dependency) -
     - **Response**:
 
         - `list[str]`: A list containing all the IP Addresses from the External Sources.
+
+        - `X-Exit-Nodes-Version` header: The version of the list, to match it with the events of `/tor-nodes/stream`.
+
+        - `X-Exit-Nodes-Stale` header: `true` while the worker is disconnected from the DataBase and can't get the latest changes, the list may be outdated until it's `false` again.
     """
 
-    all_external_ips = get_external_exit_nodes(user)
-    all_exemptions = db.query(IPAddress).all()
+    version, filtered_ips = exit_nodes_cache.snapshot()
+    response.headers["X-Exit-Nodes-Version"] = str(version)
+    response.headers["X-Exit-Nodes-Stale"] = str(exit_nodes_cache.stale).lower()
 
-    for exemption in all_exemptions:
-        try:
-            all_external_ips.remove(exemption.ipaddress)
-        except ValueError:
-            pass
+    return filtered_ips
+
+
+@router.get(
+    "/history/{ip}",
+    status_code=status.HTTP_200_OK,
+    response_model=list[ExitNodeIntervalResponse],
+    responses={400: {"model": Message}},
+)
+def get_exit_node_history(
+    db: db_dependency, user: user_dependency, ip: str, at: Optional[datetime] = None
+):
+    """
+    ## Gets the Exit Node History of an IP Address
+
+    This endpoint allows you to know during which periods an IP Address was listed as an Exit Node by the External Sources.
+
+    - **Permissions**:
+
+        - To access this API Endpoint, the User must possess one of the following roles: `Admin`, `Contributor`, or `Reader`.
+
+    - **Parameters**:
+
+        - `ip`: The IP Address to look up.
+
+        - `at`: Optional. Only return the interval covering this point in time. An empty list means the IP Address wasn't an Exit Node at that time. Intervals still open cover every time up to now.
+
+    - **Response**:
+
+        - `list[ExitNodeInterval]`: The first-seen/last-seen intervals of the IP Address, newest first.
+    """
+
+    try:
+        ipaddress.ip_address(ip)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The IP Address '{ip}' is invalid.",
+        )
+
+    intervals = db.query(ExitNodeIntervals).filter(ExitNodeIntervals.ipaddress == ip)
+
+    if at:
+        # Open intervals are still listed, so they cover every time up to now.
+        intervals = intervals.filter(
+            ExitNodeIntervals.first_seen <= to_utc(at),
+            or_(ExitNodeIntervals.open, ExitNodeIntervals.last_seen >= to_utc(at)),
+        )
+
+    return intervals.order_by(ExitNodeIntervals.first_seen.desc()).all()
+
+
+@router.post(
+    "/history/lookup",
+    status_code=status.HTTP_200_OK,
+    response_model=list[ExitNodeLookupResponse],
+)
+def lookup_exit_node_history(
+    db: db_dependency, user: user_dependency, lookup_request: ExitNodeLookupRequest
+):
+    """
+    ## Looks up if IP Addresses were Exit Nodes at given times
+
+    This endpoint allows you to check, in a single request, whether each IP Address was listed as an Exit Node at the given point in time.
+
+    - **Permissions**:
+
+        - To access this API Endpoint, the User must possess one of the following roles: `Admin`, `Contributor`, or `Reader`.
+
+    - **Request Body**:
+
+        - `lookups`: A list of up to 1000 `ipaddress` and `timestamp` pairs. The request is rejected with a 422 if any `ipaddress` isn't a valid IP Address.
 
-    return all_external_ips
+    - **Response**:
+
+        - `list[ExitNodeLookup]`: Every requested pair with `was_exit_node` set, in the same order.
+    """
+
+    if not lookup_request.lookups:
+        return []
+
+    lookups = values(
+        column("position", Integer),
+        column("ipaddress", String),
+        column("timestamp", DateTime),
+        name="lookups",
+    ).data(
+        [
+            (position, lookup.ipaddress, to_utc(lookup.timestamp))
+            for position, lookup in enumerate(lookup_request.lookups)
+        ]
+    )
+
+    was_exit_node = exists().where(
+        ExitNodeIntervals.ipaddress == lookups.c.ipaddress,
+        ExitNodeIntervals.first_seen <= lookups.c.timestamp,
+        or_(ExitNodeIntervals.open, ExitNodeIntervals.last_seen >= lookups.c.timestamp),
+    )
+
+    results = db.execute(
+        select(
+            lookups.c.ipaddress,
+            lookups.c.timestamp,
+            was_exit_node.label("was_exit_node"),
+        ).order_by(lookups.c.position)
+    ).all()
+
+    return results
+
+
+@router.get("/stream", status_code=status.HTTP_200_OK)
+async def stream_exit_node_changes(user: user_dependency):
+    """
+    ## Streams the changes of the IP Addresses from External Sources (Filtered)
+
+    This endpoint allows you to subscribe to the changes of the Exit Nodes list without the exempted IP Addresses, instead of polling `/tor-nodes/external-filtered-exemptions`. The changes are sent as Server-Sent Events.
+
+    - **Permissions**:
+
+        - To access this API Endpoint, the User must possess one of the following roles: `Admin`, `Contributor`, or `Reader`.
+
+    - **Response**:
+
+        - `version` event: Sent on connect with the current version, shared by all the workers. If it's newer than the `X-Exit-Nodes-Version` of the list the client has, the full filtered list should be fetched again.
+
+        - `exit-nodes` events: Sent when the list is refreshed or an exemption is created or deleted, with the new `version` and the `added` and `removed` IP Addresses. Events with a version the client already has can be ignored.
+
+        - The stream is closed when the Bearer Token expires, the client has to reconnect with a new one.
+    """
+
+    expires_at = user.get("expires_at") or math.inf
+    queue = broadcaster.subscribe()
+
+    async def event_stream():
+        try:
+            # Subscribed before reading it, so no change after this version can be missed.
+            version = await run_in_threadpool(exit_nodes_cache.loaded_version)
+            yield format_event("version", {"version": version})
+
+            while (remaining := expires_at - time.time()) > 0:
+                try:
+                    message = await asyncio.wait_for(
+                        queue.get(), timeout=min(STREAM_KEEPALIVE, remaining)
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                # The subscriber fell behind and was dropped, the client has to reconnect.
+                if message is None:
+                    break
+
+                yield format_event(*message)
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )